@@ -0,0 +1,225 @@
+"""
+skill-forge/file_parser.py
+上传文件解析：单个文件按扩展名提取文本，耗时的文件在子进程中并行解析，大表格转换成统计概要
+"""
+
+import io
+import json
+import multiprocessing as mp
+import os
+import tempfile
+import time
+from multiprocessing import connection as mp_connection
+
+IMAGE_EXTS = (".png", ".jpg", ".jpeg", ".gif", ".bmp", ".webp")
+# 这些格式的解析是 CPU 密集型的，可能卡住，放到子进程中并受超时限制
+HEAVY_EXTS = (".pdf", ".pptx", ".docx", ".xlsx", ".xls")
+
+TABLE_EXTS = (".csv", ".xlsx", ".xls")
+
+PARSE_TIMEOUT = 60
+MAX_WORKERS = min(4, os.cpu_count() or 1)
+_mp = mp.get_context("spawn")
+
+# 表格文件的处理方式：raw 原文；profile 统计概要 + 抽样；auto 超过 TABLE_PROFILE_BYTES 时用概要
+TABLE_MODES = ("auto", "raw", "profile")
+TABLE_PROFILE_BYTES = 20_000
+TOP_K = 5
+SAMPLE_ROWS = 20
+
+
+# ============ 1. 表格概要 ============
+
+def _fmt(v):
+    return f"{v:.4g}" if isinstance(v, float) else str(v)
+
+
+def stratified_sample(df, n=SAMPLE_ROWS, nunique=None):
+    """按取值最少（2~20 个）的分类列分层抽样，没有合适的列时随机抽样"""
+    if len(df) <= n:
+        return df
+    nunique = df.nunique() if nunique is None else nunique
+    cats = [c for c in df.columns if df[c].dtype.kind not in "biufcmM" and 2 <= nunique[c] <= 20]
+    shuffled = df.sample(frac=1, random_state=0)
+    if not cats:
+        return shuffled.head(n)
+    key = min(cats, key=lambda c: nunique[c])
+    per = max(1, n // int(nunique[key]))
+    return shuffled.groupby(key, dropna=False, sort=False).head(per).head(n)
+
+
+def profile_table(df):
+    """用 pandas 按列向量化计算类型、空值率、分位数、高频值和数值列相关性，附分层抽样的样例行"""
+    lines = [f"[表格概要] 共 {len(df)} 行 × {len(df.columns)} 列", "列名 | 类型 | 空值率 | 统计"]
+    nulls = df.isna().mean()
+    nunique = df.nunique()
+    num = df.select_dtypes("number")
+    if not num.empty:
+        q = num.quantile([0, 0.25, 0.5, 0.75, 1]).T
+        mean, std = num.mean(), num.std()
+    for col in df.columns:
+        if col in num.columns:
+            stat = (f"最小 {_fmt(q.loc[col, 0])} / p25 {_fmt(q.loc[col, 0.25])} / 中位 {_fmt(q.loc[col, 0.5])} / "
+                    f"p75 {_fmt(q.loc[col, 0.75])} / 最大 {_fmt(q.loc[col, 1])}，均值 {_fmt(mean[col])}，标准差 {_fmt(std[col])}")
+        else:
+            top = df[col].value_counts().head(TOP_K)
+            stat = f"{nunique[col]} 个不同值，最常见：" + "、".join(f"{_fmt(k)}({v})" for k, v in top.items())
+        lines.append(f"{col} | {df[col].dtype} | {nulls[col]:.1%} | {stat}")
+
+    if num.shape[1] >= 2:
+        corr = num.corr()
+        pairs = [(corr.iloc[i, j], a, b) for i, a in enumerate(corr.columns)
+                 for j, b in enumerate(corr.columns) if i < j and abs(corr.iloc[i, j]) >= 0.5]
+        if pairs:
+            lines.append("\n强相关的数值列（|r| ≥ 0.5）：")
+            for r, a, b in sorted(pairs, key=lambda p: -abs(p[0]))[:10]:
+                lines.append(f"- {a} ~ {b}：{r:.2f}")
+
+    sample = stratified_sample(df, SAMPLE_ROWS, nunique)
+    lines.append(f"\n样例行（{len(sample)} 行）：")
+    lines.append(sample.round(4).to_csv(index=False).strip())
+    return "\n".join(lines)
+
+
+def decode_csv(data):
+    """依次尝试 UTF-8 和 GB18030（兼容 GBK），都解码失败时抛出 UnicodeDecodeError"""
+    try:
+        return data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        return data.decode("gb18030")
+
+
+def profile_tabular(name, data):
+    import pandas as pd
+    if name.lower().endswith(".csv"):
+        return profile_table(pd.read_csv(io.StringIO(decode_csv(data))))
+    sheets = pd.read_excel(io.BytesIO(data), sheet_name=None)
+    return "\n".join(f"\n--- {s} ---\n{profile_table(df)}" for s, df in sheets.items())
+
+
+# ============ 2. 文件解析 ============
+
+def parse_file(name, data, table_mode="auto"):
+    """根据文件名解析文件字节内容，返回文本；出错时返回 [读取失败: ...]"""
+    lower = name.lower()
+    try:
+        if lower.endswith(TABLE_EXTS) and (table_mode == "profile" or
+                                           (table_mode == "auto" and len(data) > TABLE_PROFILE_BYTES)):
+            try:
+                return profile_tabular(name, data)
+            except Exception:
+                pass  # 没有安装 pandas、编码无法识别或表格不规整时退回原文
+        if lower.endswith(IMAGE_EXTS):
+            return f"[图片文件: {name}, 大小: {len(data)/1024:.1f}KB]"
+        elif lower.endswith((".txt", ".md")):
+            return data.decode("utf-8")
+        elif lower.endswith(".json"):
+            return json.dumps(json.loads(data.decode("utf-8")), ensure_ascii=False, indent=2)
+        elif lower.endswith(".csv"):
+            return data.decode("utf-8")
+        elif lower.endswith(".docx"):
+            from docx import Document
+            return "\n".join([p.text for p in Document(io.BytesIO(data)).paragraphs if p.text.strip()])
+        elif lower.endswith((".xlsx", ".xls")):
+            import openpyxl
+            wb = openpyxl.load_workbook(io.BytesIO(data))
+            text = ""
+            for s in wb.sheetnames:
+                ws = wb[s]
+                text += f"\n--- {s} ---\n"
+                for row in ws.iter_rows(values_only=True):
+                    text += " | ".join([str(c) if c else "" for c in row]) + "\n"
+            return text
+        elif lower.endswith(".pptx"):
+            from pptx import Presentation
+            prs = Presentation(io.BytesIO(data))
+            text = ""
+            for i, slide in enumerate(prs.slides):
+                text += f"\n--- 幻灯片 {i+1} ---\n"
+                for shape in slide.shapes:
+                    if hasattr(shape, "text") and shape.text.strip():
+                        text += shape.text + "\n"
+            return text
+        elif lower.endswith(".pdf"):
+            import PyPDF2
+            reader = PyPDF2.PdfReader(io.BytesIO(data))
+            return "\n".join([p.extract_text() for p in reader.pages])
+        else:
+            return data.decode("utf-8")
+    except Exception as e:
+        return f"[读取失败: {e}]"
+
+
+def _parse_to_file(src, dst, name, table_mode):
+    """子进程入口：从临时文件读取内容，解析结果写到另一个临时文件"""
+    with open(src, "rb") as f:
+        text = parse_file(name, f.read(), table_mode)
+    with open(dst, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+def _read_result(proc, dst):
+    if proc.exitcode != 0 or not os.path.exists(dst):
+        return f"[读取失败: 解析进程异常退出（{proc.exitcode}）]"
+    with open(dst, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def parse_files(files, on_progress=None, timeout=PARSE_TIMEOUT, max_workers=MAX_WORKERS, table_mode="auto"):
+    """
+    解析多个文件，files 为 [(文件名, 字节内容), ...]，结果按传入顺序返回。
+    文本类文件在当前进程直接解析；耗 CPU、可能卡住的文件（哪怕只有一个）各用一个子进程解析，
+    最多同时运行 max_workers 个，共用 timeout 秒的总时限，到时仍未完成的返回 [读取失败: ...]，
+    对应的子进程被杀掉。on_progress(已完成数, 总数, 文件名) 按完成顺序在每个文件完成后调用。
+    """
+    total = len(files)
+    heavy_exts = HEAVY_EXTS if table_mode == "raw" else HEAVY_EXTS + (".csv",)
+    queued = [i for i, (name, _) in enumerate(files) if name.lower().endswith(heavy_exts)]
+    results = [None] * total
+    done = 0
+
+    def finish(i, text):
+        nonlocal done
+        results[i] = text
+        done += 1
+        if on_progress:
+            on_progress(done, total, files[i][0])
+
+    deadline = time.monotonic() + timeout
+    running = {}  # sentinel -> (序号, 进程, 结果文件)
+    # 内容和结果都经临时文件传递，不经过管道：被杀掉的子进程不会让父进程卡在发送数据上
+    with tempfile.TemporaryDirectory(prefix="skill-forge-") as tmp:
+        def launch():
+            while queued and len(running) < max(1, max_workers):
+                i = queued.pop(0)
+                name, data = files[i]
+                src, dst = os.path.join(tmp, f"{i}.in"), os.path.join(tmp, f"{i}.out")
+                with open(src, "wb") as f:
+                    f.write(data)
+                # Streamlit 的服务进程是多线程的，用 spawn 避免 fork 把其他线程持有的锁带进子进程
+                proc = _mp.Process(target=_parse_to_file, args=(src, dst, name, table_mode), daemon=True)
+                proc.start()
+                running[proc.sentinel] = (i, proc, dst)
+
+        try:
+            launch()
+            heavy = set(queued) | {i for i, _, _ in running.values()}
+            for i, (name, data) in enumerate(files):
+                if i not in heavy:
+                    finish(i, parse_file(name, data, table_mode))
+            while running:
+                ready = mp_connection.wait(list(running), timeout=max(0, deadline - time.monotonic()))
+                if not ready:
+                    break
+                for sentinel in ready:
+                    i, proc, dst = running.pop(sentinel)
+                    proc.join()
+                    finish(i, _read_result(proc, dst))
+                launch()
+        finally:
+            for _, proc, _ in running.values():
+                proc.kill()
+                proc.join()
+    for i in [i for i, _, _ in running.values()] + queued:
+        finish(i, f"[读取失败: 解析超过 {timeout} 秒]")
+    return results
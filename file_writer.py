@@ -0,0 +1,90 @@
+"""
+skill-forge/file_writer.py
+把 Skill 的文字结果转换成各种格式的文件，文档类库只在用到对应格式时才导入
+"""
+import io
+from datetime import datetime
+
+def generate_txt(content, fn):
+    return content.encode("utf-8"), f"{fn}.txt", "text/plain"
+
+def generate_word(content, fn):
+    from docx import Document
+    doc = Document()
+    for line in content.split("\n"):
+        line = line.strip()
+        if not line: continue
+        if line.startswith("# "): doc.add_heading(line[2:], level=1)
+        elif line.startswith("## "): doc.add_heading(line[3:], level=2)
+        elif line.startswith("### "): doc.add_heading(line[4:], level=3)
+        else: doc.add_paragraph(line)
+    buf = io.BytesIO()
+    doc.save(buf)
+    buf.seek(0)
+    return buf.getvalue(), f"{fn}.docx", "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+def generate_excel(content, fn):
+    import openpyxl
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    for ri, line in enumerate(content.strip().split("\n"), 1):
+        line = line.strip().strip("|")
+        if not line: continue
+        for ci, cell in enumerate([c.strip() for c in line.split("|")], 1):
+            if cell.replace("-","").strip(): ws.cell(row=ri, column=ci, value=cell)
+    buf = io.BytesIO()
+    wb.save(buf)
+    buf.seek(0)
+    return buf.getvalue(), f"{fn}.xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+def generate_ppt(content, fn):
+    from pptx import Presentation
+    prs = Presentation()
+    parts = content.split("---")
+    if len(parts) == 1: parts = content.split("\n\n")
+    for part in parts:
+        part = part.strip()
+        if not part: continue
+        slide = prs.slides.add_slide(prs.slide_layouts[1])
+        lines = part.split("\n")
+        slide.shapes.title.text = lines[0].lstrip("#").strip() if lines else "幻灯片"
+        if len(lines) > 1 and slide.placeholders[1]:
+            slide.placeholders[1].text = "\n".join(lines[1:]).strip()
+    buf = io.BytesIO()
+    prs.save(buf)
+    buf.seek(0)
+    return buf.getvalue(), f"{fn}.pptx", "application/vnd.openxmlformats-officedocument.presentationml.presentation"
+
+def generate_image(content, fn, fmt="png"):
+    from PIL import Image, ImageDraw
+    lines = content.split("\n")
+    wrapped = []
+    for l in lines:
+        while len(l) > 70:
+            wrapped.append(l[:70])
+            l = l[70:]
+        wrapped.append(l)
+    h = max(600, len(wrapped)*28+80)
+    img = Image.new("RGB", (900, h), "white")
+    draw = ImageDraw.Draw(img)
+    y = 30
+    for l in wrapped:
+        draw.text((30, y), l, fill="black")
+        y += 28
+    buf = io.BytesIO()
+    img.save(buf, format="PNG" if fmt=="png" else "JPEG")
+    buf.seek(0)
+    return buf.getvalue(), f"{fn}.{fmt}", f"image/{fmt}" if fmt=="png" else "image/jpeg"
+
+def auto_generate_file(content, output_format, skill_name):
+    fn = skill_name.replace(" ","_").replace("/","_") + "_" + datetime.now().strftime("%Y%m%d_%H%M%S")
+    fmt = output_format.lower().strip()
+    if fmt in ["word","docx"]: return generate_word(content, fn)
+    elif fmt in ["excel","xlsx"]: return generate_excel(content, fn)
+    elif fmt in ["ppt","pptx"]: return generate_ppt(content, fn)
+    elif fmt in ["txt","text"]: return generate_txt(content, fn)
+    elif fmt == "json": return content.encode("utf-8"), f"{fn}.json", "application/json"
+    elif fmt in ["md","markdown"]: return content.encode("utf-8"), f"{fn}.md", "text/markdown"
+    elif fmt == "png": return generate_image(content, fn, "png")
+    elif fmt in ["jpg","jpeg"]: return generate_image(content, fn, "jpg")
+    else: return generate_txt(content, fn)
@@ -0,0 +1,291 @@
+"""
+skill-forge/llm_json.py
+校验并修复模型输出的 JSON：本地修复截断、多余逗号、代码块包裹，补齐可选字段，
+只针对缺失的必填字段向模型补问，并统计修复/补问/失败次数
+"""
+
+import json
+import re
+import threading
+
+from llm_router import route_chat
+
+STATS = {"calls": 0, "repaired": 0, "reasks": 0, "saved": 0, "failed": 0}
+_stats_lock = threading.Lock()
+
+SOP_STEP_FIELDS = ("title", "description", "input", "output", "acceptance_criteria")
+PATH_RE = re.compile(r"^(\w+)(?:\[(\d+)\]\.(\w+))?$")
+
+
+def _count(key):
+    with _stats_lock:
+        STATS[key] += 1
+
+
+def format_stats():
+    s = dict(STATS)
+    rate = s["failed"] / s["calls"] * 100 if s["calls"] else 0
+    return (f"JSON 解析 {s['calls']} 次：本地修复 {s['repaired']} 次，补问缺失字段 {s['reasks']} 次，"
+            f"避免整轮重新生成 {s['saved']} 次，失败需重试 {s['failed']} 次（重试率 {rate:.1f}%）")
+
+
+# ============ 1. 本地修复 ============
+
+def _drop_trailing_comma(out):
+    i = len(out) - 1
+    while i >= 0 and out[i] in " \t\r\n":
+        i -= 1
+    if i >= 0 and out[i] == ",":
+        del out[i]
+
+
+def repair_json(text):
+    """修复常见的 JSON 缺陷并解析：代码块包裹、前后多余文字、多余逗号、输出被截断"""
+    text = re.sub(r"^\s*```(?:json)?\s*|\s*```\s*$", "", text)
+    start = text.find("{")
+    if start < 0:
+        raise ValueError("响应中没有 JSON 对象")
+
+    out, stack, cuts = [], [], []
+    in_str = esc = False
+    for ch in text[start:]:
+        if in_str:
+            out.append(ch)
+            if esc:
+                esc = False
+            elif ch == "\\":
+                esc = True
+            elif ch == '"':
+                in_str = False
+            continue
+        if ch == '"':
+            in_str = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+            out.append(ch)
+            cuts.append((len(out), list(stack)))
+            continue
+        elif ch in "}]":
+            _drop_trailing_comma(out)
+            if stack:
+                stack.pop()
+            out.append(ch)
+            if not stack:
+                break
+            cuts.append((len(out), list(stack)))
+            continue
+        elif ch == ",":
+            # 逗号前是一个完整的值，可以在这里截断
+            cuts.append((len(out), list(stack)))
+        out.append(ch)
+
+    body = "".join(out)
+    if not stack:
+        return json.loads(body)
+
+    # 输出被截断：最后一个值完整时原地补全括号；截在字符串、数字中间时残缺的值不能用，
+    # 退回到更早的完整位置把它丢掉，校验时作为缺失字段补问
+    candidates = [] if in_str or not body.rstrip().endswith(('"', "}", "]")) else [(body, stack)]
+    candidates += [(body[:pos], snapshot) for pos, snapshot in reversed(cuts)]
+    for prefix, snapshot in candidates:
+        tail = list(prefix)
+        _drop_trailing_comma(tail)
+        try:
+            return json.loads("".join(tail) + "".join(reversed(snapshot)))
+        except ValueError:
+            continue
+    raise ValueError("JSON 无法修复")
+
+
+# ============ 2. 流式解析 ============
+
+def iter_json_events(chunks):
+    """
+    增量解析流式输出的 JSON 对象，随着内容到达逐个产出已经语法完整的部分：
+    ("field", 键, 值) —— 顶层字段的值完整了；
+    ("item", 键, 值) —— 顶层数组字段里的一个对象元素完整了（例如 steps 中的一步）
+    """
+    buf = ""
+    i = depth = 0
+    in_str = esc = after_colon = False
+    key = None
+    str_start = value_start = item_start = 0
+    for chunk in chunks:
+        buf += chunk or ""
+        while i < len(buf):
+            c = buf[i]
+            if in_str:
+                if esc:
+                    esc = False
+                elif c == "\\":
+                    esc = True
+                elif c == '"':
+                    in_str = False
+                    if depth == 1 and not after_colon:
+                        key = json.loads(buf[str_start:i + 1])
+                    elif depth == 1:
+                        yield "field", key, json.loads(buf[value_start:i + 1])
+            elif depth == 0 and c != "{":
+                pass
+            elif c == '"':
+                in_str = True
+                str_start = i
+                if depth == 1 and after_colon:
+                    value_start = i
+            elif c in "{[":
+                depth += 1
+                if depth == 2:
+                    value_start = i
+                elif depth == 3 and c == "{":
+                    item_start = i
+            elif c in "}]":
+                if depth == 3 and c == "}":
+                    yield "item", key, json.loads(buf[item_start:i + 1])
+                elif depth == 2:
+                    yield "field", key, json.loads(buf[value_start:i + 1])
+                depth -= 1
+            elif depth == 1 and c == ":":
+                after_colon = True
+            elif depth == 1 and c == ",":
+                after_colon = False
+            i += 1
+
+
+def iter_stream_partials(stream, parts):
+    """
+    消费 OpenAI 流式响应，每当有字段或数组元素完整时产出一次当前拼出的部分对象；
+    收到的全部文本片段追加到 parts，结束后由调用方拼接并交给 load_llm_json 做最终校验
+    """
+    def chunks():
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                parts.append(chunk.choices[0].delta.content)
+                yield parts[-1]
+
+    partial = {}
+    try:
+        for kind, key, value in iter_json_events(chunks()):
+            if kind == "item":
+                partial.setdefault(key, []).append(value)
+            else:
+                partial[key] = value
+            yield partial
+    except ValueError:
+        # 局部内容格式有误时不再增量展示，剩余内容照常接收，最终统一修复
+        for _ in chunks():
+            pass
+
+
+# ============ 3. 结构校验 ============
+
+def _text(value):
+    if isinstance(value, list):
+        return "；".join(str(v) for v in value)
+    return value if isinstance(value, str) else ("" if value is None else str(value))
+
+
+def validate_sop(sop):
+    """补齐 SOP 的可选字段，返回缺失的必填字段路径列表"""
+    missing = [k for k in ("title", "objective") if not _text(sop.get(k)).strip()]
+    steps = sop.get("steps")
+    if not isinstance(steps, list) or not steps:
+        missing.append("steps")
+    else:
+        sop["steps"] = steps = [s for s in steps if isinstance(s, dict)]
+        for i, step in enumerate(steps):
+            try:
+                step["step_number"] = int(step.get("step_number"))
+            except (TypeError, ValueError):
+                step["step_number"] = i + 1
+            if "depends_on" in step:
+                deps = step["depends_on"] if isinstance(step["depends_on"], list) else [step["depends_on"]]
+                step["depends_on"] = [int(d) for d in deps if str(d).strip().isdigit()]
+            for k in SOP_STEP_FIELDS:
+                if k in step:
+                    step[k] = _text(step[k])
+                if not step.get(k, "").strip():
+                    missing.append(f"steps[{i}].{k}")
+    if not isinstance(sop.get("quality_checklist"), list):
+        sop["quality_checklist"] = []
+    sop["final_deliverable"] = _text(sop.get("final_deliverable"))
+    return missing
+
+
+def validate_skill_schema(schema):
+    """规范化已有的输入输出定义，返回缺失的必填字段路径列表；缺失的字段不填默认值，留给补问"""
+    missing = [k for k in ("input_params", "output_format") if k not in schema]
+    if "input_params" in schema:
+        params = schema["input_params"]
+        schema["input_params"] = [
+            {"name": str(p["name"]), "description": _text(p.get("description")), "type": p.get("type") or "string",
+             "required": bool(p.get("required", False)), "example": _text(p.get("example"))}
+            for p in (params if isinstance(params, list) else []) if isinstance(p, dict) and p.get("name")
+        ]
+    if "output_format" in schema:
+        output = schema["output_format"]
+        output = output if isinstance(output, dict) else {}
+        fields = output.get("fields")
+        schema["output_format"] = {
+            "description": _text(output.get("description")),
+            "fields": [{"name": str(f["name"]), "description": _text(f.get("description"))}
+                       for f in (fields if isinstance(fields, list) else []) if isinstance(f, dict) and f.get("name")]
+        }
+    return missing
+
+
+# ============ 4. 补问缺失字段 ============
+
+def _set_path(obj, path, value):
+    m = PATH_RE.match(path)
+    if not m:
+        return
+    key, index, field = m.groups()
+    if index is None:
+        obj[key] = value
+    elif isinstance(obj.get(key), list) and int(index) < len(obj[key]):
+        obj[key][int(index)][field] = value
+
+
+def request_missing(client, partial, missing):
+    prompt = f"""以下 JSON 缺少部分字段：
+{json.dumps(partial, ensure_ascii=False, indent=2)}
+
+请只补全这些字段：{", ".join(missing)}
+以 JSON 输出，键为上面的字段路径，值为字段内容，例如 {{"steps[2].acceptance_criteria": "..."}}。只输出 JSON。"""
+    response = route_chat(client, "reask", messages=[{"role": "user", "content": prompt}],
+                          temperature=0.2, response_format={"type": "json_object"})
+    return repair_json(response.choices[0].message.content)
+
+
+def load_llm_json(text, validate, client=None):
+    """
+    解析模型输出并用 validate 校验；解析失败时本地修复，
+    仍缺必填字段且提供了 client 时只补问缺失部分，最终仍不完整则抛出 ValueError
+    """
+    _count("calls")
+    recovered = False
+    try:
+        try:
+            obj = json.loads(text)
+        except ValueError:
+            obj = repair_json(text)
+            _count("repaired")
+            recovered = True
+        if not isinstance(obj, dict):
+            raise ValueError("响应不是 JSON 对象")
+        missing = validate(obj)
+        if missing and client is not None:
+            _count("reasks")
+            recovered = True
+            for path, value in request_missing(client, obj, missing).items():
+                if path in missing:
+                    _set_path(obj, path, value)
+            missing = validate(obj)
+        if missing:
+            raise ValueError(f"缺少必填字段：{', '.join(missing)}")
+    except ValueError:
+        _count("failed")
+        raise
+    if recovered:
+        _count("saved")
+    return obj
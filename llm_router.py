@@ -0,0 +1,169 @@
+"""
+skill-forge/llm_router.py
+按流水线阶段路由模型调用：每个阶段可以单独指定模型；非流式请求在超过该阶段的 p95 耗时后
+再发一个相同的请求（对冲），谁先返回用谁。各阶段的耗时记录用来自动调整对冲时限
+
+阶段：sop（生成/修改 SOP）、system_prompt、schema、reask（补问缺失字段）、step（按步骤执行）、chat
+可以用环境变量 LLM_ROUTES 覆盖配置，例如：
+    LLM_ROUTES='{"schema": {"model": "deepseek-chat", "deadline": 8}, "chat": {"hedge": false}}'
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+from collections import deque
+
+# hedge：是否对冲；deadline：耗时样本不足时使用的初始对冲时限（秒）
+DEFAULT_ROUTES = {
+    "sop": {"model": "deepseek-chat", "hedge": False, "deadline": 40},
+    "system_prompt": {"model": "deepseek-chat", "hedge": True, "deadline": 30},
+    "schema": {"model": "deepseek-chat", "hedge": True, "deadline": 12},
+    "reask": {"model": "deepseek-chat", "hedge": True, "deadline": 8},
+    "step": {"model": "deepseek-chat", "hedge": True, "deadline": 20},
+    "chat": {"model": "deepseek-chat", "hedge": True, "deadline": 30},
+}
+
+WINDOW = 200          # 每个阶段保留最近多少次耗时
+MIN_SAMPLES = 20      # 样本少于这个数时使用配置里的初始时限
+MIN_DEADLINE = 1.0
+HEDGE_BUDGET = 0.1    # 对冲请求最多占总请求数的比例，避免平均成本翻倍
+
+LATENCY_BUCKETS = (1, 2, 3, 5, 8, 13, 20, 30, 45, 60, 90)
+
+
+def load_routes():
+    routes = {stage: dict(cfg) for stage, cfg in DEFAULT_ROUTES.items()}
+    override = os.getenv("LLM_ROUTES")
+    if override:
+        for stage, cfg in json.loads(override).items():
+            routes.setdefault(stage, dict(DEFAULT_ROUTES["chat"])).update(cfg)
+    return routes
+
+
+ROUTES = load_routes()
+
+_lock = threading.Lock()
+_samples = {stage: deque(maxlen=WINDOW) for stage in ROUTES}
+_counts = {"requests": 0, "hedged": 0, "hedge_wins": 0}
+
+
+# ============ 1. 耗时统计 ============
+
+def record_latency(stage, seconds):
+    with _lock:
+        _samples.setdefault(stage, deque(maxlen=WINDOW)).append(seconds)
+
+
+def _quantile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def hedge_deadline(stage):
+    """该阶段当前的对冲时限：样本足够时取最近耗时的 p95"""
+    with _lock:
+        samples = list(_samples.get(stage, ()))
+    if len(samples) < MIN_SAMPLES:
+        return ROUTES[stage]["deadline"]
+    return max(MIN_DEADLINE, _quantile(samples, 0.95))
+
+
+def latency_histogram(stage):
+    """按 LATENCY_BUCKETS 分桶的耗时计数，最后一桶是超过最大边界的请求"""
+    with _lock:
+        samples = list(_samples.get(stage, ()))
+    counts = [0] * (len(LATENCY_BUCKETS) + 1)
+    for s in samples:
+        counts[next((i for i, b in enumerate(LATENCY_BUCKETS) if s <= b), len(LATENCY_BUCKETS))] += 1
+    return counts
+
+
+def format_latency():
+    lines = [f"模型请求 {_counts['requests']} 次，对冲 {_counts['hedged']} 次，对冲请求先返回 {_counts['hedge_wins']} 次"]
+    for stage in ROUTES:
+        with _lock:
+            samples = list(_samples.get(stage, ()))
+        if samples:
+            labels = [f"≤{b}s" for b in LATENCY_BUCKETS] + [f">{LATENCY_BUCKETS[-1]}s"]
+            hist = " / ".join(f"{label} {n}" for label, n in zip(labels, latency_histogram(stage)) if n)
+            lines.append(f"{stage}（{ROUTES[stage]['model']}）：{len(samples)} 次，p50 {_quantile(samples, 0.5):.1f}s，"
+                         f"p95 {_quantile(samples, 0.95):.1f}s，对冲时限 {hedge_deadline(stage):.1f}s\n\n耗时分布：{hist}")
+    return "\n\n".join(lines)
+
+
+# ============ 2. 路由与对冲 ============
+
+def stage_model(stage):
+    return ROUTES.get(stage, ROUTES["chat"])["model"]
+
+
+def _timed_create(client, stage, kwargs):
+    start = time.time()
+    response = client.chat.completions.create(**kwargs)
+    record_latency(stage, time.time() - start)
+    return response
+
+
+def _timed_stream(stream, stage, start):
+    for chunk in stream:
+        yield chunk
+    record_latency(stage, time.time() - start)
+
+
+def _send(client, stage, kwargs, results, tag):
+    """在新的守护线程中立即发出请求，结果放入 results；进程退出时不等待落后的请求"""
+    def run():
+        try:
+            results.put((tag, _timed_create(client, stage, kwargs), None))
+        except Exception as e:
+            results.put((tag, None, e))
+    threading.Thread(target=run, daemon=True).start()
+
+
+def route_chat(client, stage, **kwargs):
+    """按阶段选择模型并发起 chat.completions 请求，参数与 create 相同（不需要 model）"""
+    stage = stage if stage in ROUTES else "chat"
+    route = ROUTES[stage]
+    kwargs["model"] = route["model"]
+    with _lock:
+        _counts["requests"] += 1
+    if kwargs.get("stream"):
+        # 流式请求不对冲，只在读完后记录总耗时
+        return _timed_stream(client.chat.completions.create(**kwargs), stage, time.time())
+    if not route["hedge"]:
+        return _timed_create(client, stage, kwargs)
+
+    # 每个请求单独一个线程，不经过共享的线程池，对冲时限从请求真正发出时开始计算
+    results = queue.Queue()
+    _send(client, stage, kwargs, results, "primary")
+    try:
+        _, response, error = results.get(timeout=hedge_deadline(stage))
+    except queue.Empty:
+        pass
+    else:
+        if error is not None:
+            raise error
+        return response
+
+    with _lock:
+        allowed = _counts["hedged"] < HEDGE_BUDGET * _counts["requests"]
+        if allowed:
+            _counts["hedged"] += 1
+    if not allowed:
+        _, response, error = results.get()
+        if error is not None:
+            raise error
+        return response
+
+    # 已经发出的请求无法取消，落后的那个结果直接丢弃
+    _send(client, stage, kwargs, results, "backup")
+    for _ in range(2):
+        tag, response, error = results.get()
+        if error is None:
+            if tag == "backup":
+                with _lock:
+                    _counts["hedge_wins"] += 1
+            return response
+    raise error
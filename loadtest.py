@@ -0,0 +1,259 @@
+"""
+skill-forge/loadtest.py
+多用户压测：启动本地模拟模型服务，用 N 个模拟会话驱动真实的 main.py（Gradio）或 web.py（Streamlit），
+每个会话依次执行 生成 → 修改 → 撤销 → 确认 → 对话，
+统计每个操作的排队延迟、p50/p95/p99 耗时、每会话内存和错误率
+
+用法：
+    python loadtest.py --ui main --sessions 20 --scale 0.1
+    python loadtest.py --ui web --sessions 10 --scale 0.1 --json report.json
+
+Gradio 模式需要 gradio_client，Streamlit 模式使用 streamlit.testing 在进程内运行脚本
+"""
+
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from mock_llm_server import REQUEST_LOG, start_server
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+ACTIONS = ["generate", "refine", "undo", "confirm", "chat"]
+# 这些操作会调用模型，可以从模拟服务的请求记录里算出排队延迟
+LLM_ACTIONS = {"generate", "refine", "confirm", "chat"}
+
+records = []
+_records_lock = threading.Lock()
+
+
+# ============ 1. 工具函数 ============
+
+def rss_mb(pid):
+    """读取进程常驻内存（MB），非 Linux 系统返回 None"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, int(round(p / 100 * len(values))) - 1))]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def timed(session, action, fn, check):
+    """执行一个操作并记录耗时；check 返回 False 或抛出异常都算错误"""
+    start = time.time()
+    error = None
+    try:
+        result = fn()
+        if not check(result):
+            error = "结果不属于当前会话或包含错误信息"
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    with _records_lock:
+        records.append({"session": session, "action": action, "start": start, "end": time.time(), "error": error})
+
+
+def run_session(target, tag):
+    try:
+        target(tag)
+    except Exception as e:
+        with _records_lock:
+            records.append({"session": tag, "action": "start", "start": time.time(), "end": time.time(),
+                            "error": f"{type(e).__name__}: {e}"})
+
+
+def session_script(tag):
+    return (f"为主题 {tag} 写一篇小红书笔记", "500字左右，包含标题、正文、标签", "第二步太笼统了，请拆细", "主题：周末仪式感")
+
+
+# ============ 2. Gradio（main.py） ============
+
+def run_gradio_session(url, tag, think):
+    from gradio_client import Client
+    task, deliverable, feedback, chat = session_script(tag)
+    c = Client(url, verbose=False)
+    ok = lambda text: tag in text and "❌" not in text
+    timed(tag, "generate", lambda: c.predict(task, deliverable, api_name="/generate_sop"), lambda r: ok(r[0]))
+    time.sleep(think)
+    timed(tag, "refine", lambda: c.predict(feedback, api_name="/refine_sop"), lambda r: ok(r[0]))
+    time.sleep(think)
+    timed(tag, "undo", lambda: c.predict(api_name="/undo_sop"), lambda r: ok(r[0]))
+    time.sleep(think)
+    timed(tag, "confirm", lambda: c.predict(api_name="/confirm_and_generate_skill"), lambda r: ok(r[1]))
+    time.sleep(think)
+    timed(tag, "chat", lambda: c.predict(chat, api_name="/use_current_skill"), ok)
+
+
+def start_gradio(base_url, workdir):
+    port = free_port()
+    env = dict(os.environ, DEEPSEEK_BASE_URL=base_url, DEEPSEEK_API_KEY="mock", GRADIO_SERVER_PORT=str(port))
+    proc = subprocess.Popen([sys.executable, os.path.join(REPO_DIR, "main.py")], cwd=workdir, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}/"
+    deadline = time.time() + 120
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(url, timeout=2)
+            return proc, url
+        except OSError:
+            time.sleep(0.5)
+    proc.kill()
+    raise RuntimeError("main.py 启动超时")
+
+
+# ============ 3. Streamlit（web.py） ============
+
+def run_streamlit_session(tag, think):
+    from streamlit.testing.v1 import AppTest
+    task, deliverable, feedback, chat = session_script(tag)
+    at = AppTest.from_file(os.path.join(REPO_DIR, "web.py"), default_timeout=600).run()
+
+    def click(prefix):
+        next(b for b in at.button if b.label.startswith(prefix)).click().run()
+        if at.exception or at.error:
+            raise RuntimeError((at.exception or at.error)[0].value)
+        return at
+
+    def sop_shown(_):
+        return any(tag in m.value for m in at.markdown)
+
+    def skill_ready(_):
+        skill = at.session_state["skill"]
+        return skill is not None and tag in skill["skill_name"]
+
+    def chat_done(_):
+        history = at.session_state["chat_history"]
+        return bool(history) and history[-1]["role"] == "assistant" and tag in history[-1]["content"]
+
+    at.text_area[0].input(task)
+    at.text_area[1].input(deliverable)
+    timed(tag, "generate", lambda: click("🚀"), sop_shown)
+    time.sleep(think)
+    at.text_input[0].input(feedback)
+    timed(tag, "refine", lambda: click("✏️"), sop_shown)
+    time.sleep(think)
+    timed(tag, "undo", lambda: click("↩️"), sop_shown)
+    time.sleep(think)
+    timed(tag, "confirm", lambda: click("✅"), skill_ready)
+    time.sleep(think)
+    timed(tag, "chat", lambda: at.chat_input[0].set_value(chat).run(), chat_done)
+
+
+# ============ 4. 汇总报告 ============
+
+def queue_delay(record):
+    """操作开始到该会话第一个模型请求到达模拟服务的时间"""
+    starts = [r["start"] for r in REQUEST_LOG
+              if r["tag"] == record["session"] and record["start"] <= r["start"] <= record["end"]]
+    return min(starts) - record["start"] if starts else None
+
+
+def build_report(ui, sessions, duration, mem_before, mem_after):
+    report = {"ui": ui, "sessions": sessions, "duration_s": round(duration, 2), "actions": {}}
+    for action in ACTIONS:
+        rows = [r for r in records if r["action"] == action]
+        lat = [r["end"] - r["start"] for r in rows]
+        queue = [q for q in (queue_delay(r) for r in rows if action in LLM_ACTIONS) if q is not None]
+        report["actions"][action] = {
+            "count": len(rows),
+            "errors": sum(1 for r in rows if r["error"]),
+            "p50": percentile(lat, 50), "p95": percentile(lat, 95), "p99": percentile(lat, 99),
+            "queue_p50": percentile(queue, 50), "queue_p95": percentile(queue, 95),
+        }
+    total = len(records)
+    report["error_rate"] = sum(1 for r in records if r["error"]) / total if total else 0
+    report["llm_requests"] = len(REQUEST_LOG)
+    if mem_before is not None and mem_after is not None:
+        report["memory_per_session_mb"] = round((mem_after - mem_before) / sessions, 2)
+    report["sample_errors"] = sorted({r["error"] for r in records if r["error"]})[:5]
+    return report
+
+
+def print_report(report):
+    fmt = lambda v: "-" if v is None else f"{v:.2f}"
+    print(f"\n界面：{report['ui']}  会话数：{report['sessions']}  总耗时：{report['duration_s']}s  "
+          f"模型请求：{report['llm_requests']}  错误率：{report['error_rate']*100:.1f}%")
+    if "memory_per_session_mb" in report:
+        print(f"每会话内存：{report['memory_per_session_mb']} MB")
+    print(f"\n{'操作':<10}{'次数':>6}{'错误':>6}{'p50':>9}{'p95':>9}{'p99':>9}{'排队p50':>10}{'排队p95':>10}")
+    for action, s in report["actions"].items():
+        print(f"{action:<10}{s['count']:>6}{s['errors']:>6}{fmt(s['p50']):>9}{fmt(s['p95']):>9}"
+              f"{fmt(s['p99']):>9}{fmt(s['queue_p50']):>10}{fmt(s['queue_p95']):>10}")
+    for e in report["sample_errors"]:
+        print(f"  ⚠️ {e}")
+
+
+# ============ 5. 启动 ============
+
+def main():
+    parser = argparse.ArgumentParser(description="Skill Forge 多用户压测")
+    parser.add_argument("--ui", choices=["main", "web"], default="main", help="main=Gradio，web=Streamlit")
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--scale", type=float, default=0.1, help="模拟延迟缩放系数")
+    parser.add_argument("--ramp", type=float, default=0.2, help="相邻会话启动间隔（秒）")
+    parser.add_argument("--think", type=float, default=0.5, help="每个操作之间用户停顿（秒）")
+    parser.add_argument("--json", help="把报告另存为 JSON 文件")
+    args = parser.parse_args()
+
+    server, base_url = start_server(0, args.scale)
+    run_id = random.randint(100, 999)
+    tags = [f"LT{run_id}S{i}" for i in range(args.sessions)]
+    workdir = tempfile.mkdtemp(prefix="skillforge-load-")
+
+    proc = None
+    if args.ui == "main":
+        proc, url = start_gradio(base_url, workdir)
+        pid = proc.pid
+        target = lambda tag: run_gradio_session(url, tag, args.think)
+    else:
+        os.environ.update(DEEPSEEK_BASE_URL=base_url, DEEPSEEK_API_KEY="mock")
+        os.chdir(workdir)
+        sys.path.insert(0, REPO_DIR)
+        pid = os.getpid()
+        target = lambda tag: run_streamlit_session(tag, args.think)
+
+    mem_before = rss_mb(pid)
+    start = time.time()
+    try:
+        with ThreadPoolExecutor(max_workers=args.sessions) as pool:
+            for tag in tags:
+                pool.submit(run_session, target, tag)
+                time.sleep(args.ramp)
+        mem_after = rss_mb(pid)
+    finally:
+        if proc is not None:
+            proc.terminate()
+        server.shutdown()
+
+    report = build_report(args.ui, args.sessions, time.time() - start, mem_before, mem_after)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
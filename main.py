@@ -5,10 +5,15 @@ skill-forge/web.py
 
 import os
 import json
+import hashlib
+import threading
+from concurrent.futures import Future
 from datetime import datetime
 from dotenv import load_dotenv
 from openai import OpenAI
 import gradio as gr
+from llm_router import route_chat, format_latency
+from llm_json import load_llm_json, validate_sop, validate_skill_schema, iter_stream_partials, format_stats
 
 # ============ 1. 初始化 ============
 
@@ -16,7 +21,7 @@ load_dotenv()
 
 client = OpenAI(
     api_key=os.getenv("DEEPSEEK_API_KEY"),
-    base_url="https://api.deepseek.com"
+    base_url=os.getenv("DEEPSEEK_BASE_URL", "https://api.deepseek.com")
 )
 
 SKILLS_DIR = "skills"
@@ -26,17 +31,51 @@ if not os.path.exists(SKILLS_DIR):
 current_state = {
     "sop": None,
     "sop_history": [],
-    "skill": None
+    "skill": None,
+    "skill_spec": None
 }
 
 
+def run_in_background(fn, *args):
+    """用户审阅 SOP 时在后台预先生成 Skill：在守护线程中执行 fn 并返回 Future，退出程序时不等待进行中的请求"""
+    future = Future()
+
+    def run():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, daemon=True).start()
+    return future
+
+
 # ============ 2. SOP 生成 ============
 
+def stream_sop(prompt):
+    """流式生成 SOP：每有字段或步骤完整就产出一次 (部分 SOP, None)，最后产出 (None, 校验后的完整 SOP)"""
+    stream = route_chat(
+        client, "sop",
+        messages=[{"role": "user", "content": prompt}],
+        temperature=0.3,
+        response_format={"type": "json_object"},
+        stream=True
+    )
+    parts = []
+    for partial in iter_stream_partials(stream, parts):
+        yield partial, None
+    yield None, load_llm_json("".join(parts), validate_sop, client)
+
+
 def generate_sop(task_description, deliverable):
     if not task_description.strip():
-        return "❌ 请输入任务描述", "请先填写任务描述"
+        yield "❌ 请输入任务描述", "请先填写任务描述"
+        return
     if not deliverable.strip():
-        return "❌ 请输入交付要求", "请先填写交付要求"
+        yield "❌ 请输入交付要求", "请先填写交付要求"
+        return
 
     prompt = f"""你是一个专业的流程设计专家。请根据以下信息，生成一份详细的标准操作流程(SOP)。
 
@@ -57,7 +96,8 @@ def generate_sop(task_description, deliverable):
             "description": "具体做什么、怎么做",
             "input": "这一步需要什么",
             "output": "这一步产出什么",
-            "acceptance_criteria": "怎么算做完了"
+            "acceptance_criteria": "怎么算做完了",
+            "depends_on": []
         }}
     ],
     "quality_checklist": ["检查项1", "检查项2"],
@@ -68,31 +108,31 @@ def generate_sop(task_description, deliverable):
 1. 步骤要细致，每一步都是可执行的
 2. 上一步的 output 要能衔接下一步的 input
 3. 每步都有明确的完成标准
+4. depends_on 列出这一步的 input 用到了哪些前面步骤的 step_number，不依赖任何步骤则为空列表
 
 只输出JSON，不要其他内容。"""
 
     try:
-        response = client.chat.completions.create(
-            model="deepseek-chat",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.3,
-            response_format={"type": "json_object"}
-        )
-        sop = json.loads(response.choices[0].message.content)
+        for partial, sop in stream_sop(prompt):
+            if partial is not None:
+                yield format_sop(partial), "⏳ 正在生成 SOP..."
         current_state["sop"] = sop
         current_state["sop_history"] = []
-        return format_sop(sop), "✅ SOP 生成成功！你可以修改、撤销或直接确认。"
+        speculate_skill(sop)
+        yield format_sop(sop), "✅ SOP 生成成功！你可以修改、撤销或直接确认。"
     except Exception as e:
-        return f"❌ 生成失败：{e}", "生成出错了"
+        yield f"❌ 生成失败：{e}", "生成出错了"
 
 
 # ============ 3. SOP 修改 ============
 
 def refine_sop(feedback):
     if current_state["sop"] is None:
-        return "❌ 请先生成 SOP", "请先点击「生成 SOP」"
+        yield "❌ 请先生成 SOP", "请先点击「生成 SOP」"
+        return
     if not feedback.strip():
-        return format_sop(current_state["sop"]), "❌ 请输入修改意见"
+        yield format_sop(current_state["sop"]), "❌ 请输入修改意见"
+        return
 
     prompt = f"""你之前生成了以下 SOP：
 
@@ -105,19 +145,16 @@ def refine_sop(feedback):
 只输出 JSON，不要其他内容。"""
 
     try:
-        response = client.chat.completions.create(
-            model="deepseek-chat",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.3,
-            response_format={"type": "json_object"}
-        )
-        new_sop = json.loads(response.choices[0].message.content)
+        for partial, new_sop in stream_sop(prompt):
+            if partial is not None:
+                yield format_sop(partial), "⏳ 正在修改 SOP..."
         current_state["sop_history"].append(current_state["sop"])
         current_state["sop"] = new_sop
+        speculate_skill(new_sop)
         version = len(current_state["sop_history"]) + 1
-        return format_sop(new_sop), f"✅ SOP 已修改（当前第 {version} 版，可撤销）"
+        yield format_sop(new_sop), f"✅ SOP 已修改（当前第 {version} 版，可撤销）"
     except Exception as e:
-        return f"❌ 修改失败：{e}", "修改出错了"
+        yield f"❌ 修改失败：{e}", "修改出错了"
 
 
 # ============ 4. 撤销修改 ============
@@ -129,18 +166,14 @@ def undo_sop():
         return "❌ 没有 SOP 可以撤销", "请先生成 SOP"
 
     current_state["sop"] = current_state["sop_history"].pop()
+    speculate_skill(current_state["sop"])
     remaining = len(current_state["sop_history"])
     return format_sop(current_state["sop"]), f"✅ 已撤销！还可以再撤销 {remaining} 次"
 
 
 # ============ 5. 生成 Skill ============
 
-def confirm_and_generate_skill():
-    if current_state["sop"] is None:
-        return "", "", "❌ 请先生成 SOP"
-
-    sop = current_state["sop"]
-
+def generate_system_prompt(sop):
     prompt_for_system = f"""请根据以下 SOP，为一个 AI 助手编写 system prompt。
 这个 AI 助手未来会按照这个 SOP 自动执行任务。
 
@@ -156,16 +189,15 @@ SOP 内容：
 
 直接输出 system prompt 文本，不要任何包装。"""
 
-    try:
-        r1 = client.chat.completions.create(
-            model="deepseek-chat",
-            messages=[{"role": "user", "content": prompt_for_system}],
-            temperature=0.2
-        )
-        system_prompt = r1.choices[0].message.content
-    except Exception as e:
-        return "", "", f"❌ System Prompt 生成失败：{e}"
+    r1 = route_chat(
+        client, "system_prompt",
+        messages=[{"role": "user", "content": prompt_for_system}],
+        temperature=0.2
+    )
+    return r1.choices[0].message.content
+
 
+def generate_schema(sop):
     prompt_for_schema = f"""根据以下 SOP，定义这个工具的输入参数和输出格式。
 
 SOP 内容：
@@ -192,16 +224,75 @@ SOP 内容：
 
 只输出 JSON。"""
 
-    try:
-        r2 = client.chat.completions.create(
-            model="deepseek-chat",
-            messages=[{"role": "user", "content": prompt_for_schema}],
-            temperature=0.2,
-            response_format={"type": "json_object"}
-        )
-        schema = json.loads(r2.choices[0].message.content)
-    except Exception as e:
-        return "", "", f"❌ 输入输出定义生成失败：{e}"
+    r2 = route_chat(
+        client, "schema",
+        messages=[{"role": "user", "content": prompt_for_schema}],
+        temperature=0.2,
+        response_format={"type": "json_object"}
+    )
+    return load_llm_json(r2.choices[0].message.content, validate_skill_schema, client)
+
+
+def sop_hash(sop):
+    return hashlib.sha256(json.dumps(sop, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def speculate_skill(sop):
+    """SOP 展示后立即在后台生成 system prompt 和输入输出定义"""
+    h = sop_hash(sop)
+    spec = current_state["skill_spec"]
+    if spec is not None and spec["hash"] == h:
+        return
+    discard_speculation()
+    current_state["skill_spec"] = {
+        "hash": h,
+        "system_prompt": run_in_background(generate_system_prompt, sop),
+        "schema": run_in_background(generate_schema, sop)
+    }
+
+
+def discard_speculation():
+    # 已经开始的请求无法中断，只能丢弃结果
+    spec = current_state["skill_spec"]
+    if spec is not None:
+        spec["system_prompt"].cancel()
+        spec["schema"].cancel()
+    current_state["skill_spec"] = None
+
+
+def take_speculation(sop):
+    """SOP 未变化时返回预生成的 (system_prompt, schema)，没有预生成或生成失败的部分为 None"""
+    spec = current_state["skill_spec"]
+    current_state["skill_spec"] = None
+    if spec is None or spec["hash"] != sop_hash(sop):
+        return None, None
+    parts = []
+    for key in ("system_prompt", "schema"):
+        try:
+            parts.append(spec[key].result())
+        except Exception:
+            parts.append(None)
+    return tuple(parts)
+
+
+def confirm_and_generate_skill():
+    if current_state["sop"] is None:
+        return "", "", "❌ 请先生成 SOP"
+
+    sop = current_state["sop"]
+
+    system_prompt, schema = take_speculation(sop)
+    if system_prompt is None:
+        try:
+            system_prompt = generate_system_prompt(sop)
+        except Exception as e:
+            return "", "", f"❌ System Prompt 生成失败：{e}"
+
+    if schema is None:
+        try:
+            schema = generate_schema(sop)
+        except Exception as e:
+            return "", "", f"❌ 输入输出定义生成失败：{e}"
 
     skill = {
         "skill_name": sop["title"],
@@ -233,8 +324,8 @@ def use_current_skill(user_input):
         return "❌ 请输入内容"
 
     try:
-        response = client.chat.completions.create(
-            model="deepseek-chat",
+        response = route_chat(
+            client, "chat",
             messages=[
                 {"role": "system", "content": current_state["skill"]["system_prompt"]},
                 {"role": "user", "content": user_input}
@@ -283,19 +374,23 @@ def refresh_skill_list():
 # ============ 8. 格式化显示 ============
 
 def format_sop(sop):
-    text = f"# 📋 {sop['title']}\n\n"
-    text += f"**🎯 目标：** {sop['objective']}\n\n---\n\n"
-    text += "## 📝 步骤\n\n"
-    for step in sop["steps"]:
-        text += f"### 步骤 {step['step_number']}：{step['title']}\n"
-        text += f"- 📖 **描述：** {step['description']}\n"
-        text += f"- 📥 **输入：** {step['input']}\n"
-        text += f"- 📤 **输出：** {step['output']}\n"
-        text += f"- ✅ **完成标准：** {step['acceptance_criteria']}\n\n"
-    text += "---\n\n## 🔍 质量检查清单\n\n"
-    for item in sop["quality_checklist"]:
-        text += f"- [ ] {item}\n"
-    text += f"\n---\n\n**📦 最终交付物：** {sop['final_deliverable']}"
+    # 流式生成时 sop 可能只有部分字段，已到达的部分先展示
+    text = f"# 📋 {sop.get('title', '...')}\n\n"
+    if "objective" in sop:
+        text += f"**🎯 目标：** {sop['objective']}\n\n"
+    text += "---\n\n## 📝 步骤\n\n"
+    for step in sop.get("steps", []):
+        text += f"### 步骤 {step.get('step_number', '')}：{step.get('title', '')}\n"
+        text += f"- 📖 **描述：** {step.get('description', '')}\n"
+        text += f"- 📥 **输入：** {step.get('input', '')}\n"
+        text += f"- 📤 **输出：** {step.get('output', '')}\n"
+        text += f"- ✅ **完成标准：** {step.get('acceptance_criteria', '')}\n\n"
+    if "quality_checklist" in sop:
+        text += "---\n\n## 🔍 质量检查清单\n\n"
+        for item in sop["quality_checklist"]:
+            text += f"- [ ] {item}\n"
+    if "final_deliverable" in sop:
+        text += f"\n---\n\n**📦 最终交付物：** {sop['final_deliverable']}"
     return text
 
 
@@ -319,6 +414,10 @@ def format_skill(skill):
     return text
 
 
+def format_runtime_stats():
+    return format_stats() + "\n\n" + format_latency()
+
+
 # ============ 9. 搭建网页界面 ============
 
 with gr.Blocks(title="Skill Forge", theme=gr.themes.Soft()) as app:
@@ -480,6 +579,18 @@ with gr.Blocks(title="Skill Forge", theme=gr.themes.Soft()) as app:
                 outputs=[loaded_use_output]
             )
 
+    gr.Markdown("---")
+
+    with gr.Accordion("📊 运行统计", open=False):
+        stats_display = gr.Markdown(format_runtime_stats)
+        stats_btn = gr.Button("🔄 刷新统计")
+
+    stats_btn.click(
+        fn=format_runtime_stats,
+        inputs=[],
+        outputs=[stats_display]
+    )
+
 # ============ 10. 启动 ============
 
 if __name__ == "__main__":
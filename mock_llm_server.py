@@ -0,0 +1,165 @@
+"""
+skill-forge/mock_llm_server.py
+本地模拟的 OpenAI 兼容接口，用于压测：按请求类型模拟真实的延迟分布，返回结构正确的内容，
+并记录每个请求属于哪个压测会话（通过提示词里的会话标记识别）
+
+单独运行：python mock_llm_server.py --port 8800 --scale 0.1
+然后设置 DEEPSEEK_BASE_URL=http://127.0.0.1:8800 启动 main.py 或 web.py
+"""
+
+import argparse
+import json
+import math
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 各类请求的延迟分布：(中位数秒数, 对数正态 sigma)
+LATENCY = {
+    "sop": (12.0, 0.45),
+    "system_prompt": (8.0, 0.4),
+    "schema": (4.0, 0.35),
+    "reask": (2.0, 0.3),
+    "step": (4.0, 0.4),
+    "chat": (6.0, 0.5),
+}
+
+TAG_RE = re.compile(r"LT\d+S\d+")
+
+REQUEST_LOG = []
+_log_lock = threading.Lock()
+
+
+def classify(body):
+    """根据提示词判断这是流水线中的哪一类请求"""
+    messages = body.get("messages", [])
+    prompt = messages[-1]["content"] if messages else ""
+    wants_json = (body.get("response_format") or {}).get("type") == "json_object"
+    if "缺少部分字段" in prompt:
+        return "reask"
+    if wants_json and "input_params" in prompt:
+        return "schema"
+    if wants_json:
+        return "sop"
+    if "system prompt" in prompt:
+        return "system_prompt"
+    if "现在只需完成其中一步" in prompt:
+        return "step"
+    return "chat"
+
+
+def fake_content(kind, tag):
+    if kind == "sop":
+        steps = [{
+            "step_number": i,
+            "title": f"{tag} 步骤{i}",
+            "description": "按要求完成这一步的具体操作。" * 3,
+            "input": "任务描述" if i == 1 else f"步骤{i-1}的产出",
+            "output": f"步骤{i}的产出",
+            "acceptance_criteria": "产出完整、符合交付要求。",
+            "depends_on": [] if i == 1 else [i - 1],
+        } for i in range(1, 7)]
+        return json.dumps({"title": f"{tag} 标准操作流程", "objective": f"完成 {tag} 的任务",
+                           "steps": steps, "quality_checklist": ["内容完整", "格式正确"],
+                           "final_deliverable": "最终交付物"}, ensure_ascii=False)
+    if kind == "schema":
+        return json.dumps({"input_params": [{"name": "topic", "description": "主题", "type": "string",
+                                             "required": True, "example": "示例"}],
+                           "output_format": {"description": "完整结果", "fields": [
+                               {"name": "content", "description": "正文"}]}}, ensure_ascii=False)
+    if kind == "reask":
+        return "{}"
+    if kind == "system_prompt":
+        return f"你是执行「{tag}」任务的助手。\n" + "请严格按照 SOP 的每一步执行并检查质量。\n" * 20
+    return f"# {tag} 执行结果\n\n" + "这是模拟生成的内容。" * 80
+
+
+def sample_latency(kind, scale):
+    median, sigma = LATENCY[kind]
+    return median * math.exp(random.gauss(0, sigma)) * scale
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    scale = 1.0
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        start = time.time()
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        kind = classify(body)
+        text = "\n".join(m.get("content") or "" for m in body.get("messages", []))
+        m = TAG_RE.search(text)
+        tag = m.group(0) if m else ""
+        latency = sample_latency(kind, self.scale)
+        content = fake_content(kind, tag)
+        if body.get("stream"):
+            self.send_stream(body, start, content, latency)
+        else:
+            time.sleep(latency)
+            self.send_completion(body, start, text, content)
+        with _log_lock:
+            REQUEST_LOG.append({"tag": tag, "kind": kind, "start": start, "end": time.time()})
+
+    def send_completion(self, body, start, text, content):
+        payload = {
+            "id": f"mock-{int(start * 1000)}",
+            "object": "chat.completion",
+            "created": int(start),
+            "model": body.get("model", "mock"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                         "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": len(text) // 2, "completion_tokens": len(content) // 2,
+                      "total_tokens": (len(text) + len(content)) // 2},
+        }
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_stream(self, body, start, content, latency, pieces=20):
+        """按 SSE 分块返回：首块在总延迟的 20% 处到达，其余均匀分布"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        size = max(1, math.ceil(len(content) / pieces))
+        chunks = [content[i:i + size] for i in range(0, len(content), size)]
+        time.sleep(latency * 0.2)
+        for piece in chunks + [None]:
+            delta = {"content": piece} if piece is not None else {}
+            event = {"id": f"mock-{int(start * 1000)}", "object": "chat.completion.chunk", "created": int(start),
+                     "model": body.get("model", "mock"),
+                     "choices": [{"index": 0, "delta": delta, "finish_reason": None if piece is not None else "stop"}]}
+            self.wfile.write(f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            if piece is not None:
+                time.sleep(latency * 0.8 / len(chunks))
+        self.wfile.write(b"data: [DONE]\n\n")
+
+
+def start_server(port=0, scale=1.0):
+    """在后台线程启动模拟服务，返回 (server, base_url)"""
+    handler = type("ScaledMockHandler", (MockHandler,), {"scale": scale})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Skill Forge 压测用的模拟模型服务")
+    parser.add_argument("--port", type=int, default=8800)
+    parser.add_argument("--scale", type=float, default=1.0, help="延迟缩放系数，0.1 表示所有延迟缩短为十分之一")
+    args = parser.parse_args()
+    server, url = start_server(args.port, args.scale)
+    print(f"模拟服务已启动：{url}  （Control + C 停止）")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,146 @@
+"""
+skill-forge/run_skill.py
+轻量的 Skill 运行器：不启动 Gradio / Streamlit，直接加载 skills/ 下的 Skill 执行一次，
+适合定时任务和 Serverless 调用。只导入标准库，文档类库按输出格式按需导入
+
+用法：
+    python run_skill.py --list
+    python run_skill.py 小红书笔记 "主题：周末仪式感"
+    echo "主题：周末仪式感" | python run_skill.py 小红书笔记 --format docx
+    python run_skill.py skills/xxx.json "..." --steps --timing
+"""
+
+import time
+
+_t0 = time.perf_counter()
+
+import argparse
+import json
+import os
+import sys
+import urllib.request
+from types import SimpleNamespace
+
+SKILLS_DIR = "skills"
+OUTPUT_DIR = "outputs"
+
+
+# ============ 1. 精简的模型客户端 ============
+
+def load_env(path=".env"):
+    """读取 .env 中的 KEY=VALUE，已有的环境变量不覆盖（不依赖 python-dotenv）"""
+    if not os.path.exists(path):
+        return
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#") and "=" in line:
+                key, value = line.split("=", 1)
+                os.environ.setdefault(key.strip(), value.strip().strip("'\""))
+
+
+def make_client(api_key, base_url):
+    """只实现 chat.completions.create（非流式），接口与 OpenAI 客户端一致"""
+    def create(**kwargs):
+        req = urllib.request.Request(
+            base_url.rstrip("/") + "/chat/completions",
+            data=json.dumps(kwargs).encode("utf-8"),
+            headers={"Content-Type": "application/json", "Authorization": f"Bearer {api_key}"}
+        )
+        with urllib.request.urlopen(req, timeout=600) as resp:
+            data = json.loads(resp.read().decode("utf-8"))
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=c["message"]["content"])) for c in data["choices"]],
+            usage=data.get("usage")
+        )
+    return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+
+# ============ 2. 加载与执行 ============
+
+def list_skills():
+    if not os.path.exists(SKILLS_DIR):
+        return []
+    return [f.replace(".json", "").replace("_", " ") for f in sorted(os.listdir(SKILLS_DIR)) if f.endswith(".json")]
+
+
+def load_skill(name):
+    path = name if name.endswith(".json") else os.path.join(SKILLS_DIR, name.replace(" ", "_") + ".json")
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def run_skill(client, skill, user_input, steps=False):
+    from llm_router import route_chat
+    if steps and skill.get("source_sop", {}).get("steps"):
+        from sop_engine import run_sop_steps
+        done = run_sop_steps(client, skill["source_sop"], user_input)
+        return "\n\n".join(f"### 步骤 {s['step_number']}：{s['title']}\n{r}" for s, r, _ in done)
+    response = route_chat(client, "chat", messages=[
+        {"role": "system", "content": skill["system_prompt"]},
+        {"role": "user", "content": user_input}
+    ], temperature=0.3)
+    return response.choices[0].message.content
+
+
+# ============ 3. 命令行 ============
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="直接执行一个已保存的 Skill")
+    parser.add_argument("skill", nargs="?", help="Skill 名称（skills/ 下的文件名）或 JSON 文件路径")
+    parser.add_argument("input", nargs="*", help="输入内容；省略时从标准输入读取")
+    parser.add_argument("--format", help="同时生成文件：docx/xlsx/pptx/txt/md/json/png/jpg")
+    parser.add_argument("--out", default=OUTPUT_DIR, help="生成文件的目录")
+    parser.add_argument("--steps", action="store_true", help="按 SOP 步骤执行")
+    parser.add_argument("--list", action="store_true", help="列出已保存的 Skill")
+    parser.add_argument("--timing", action="store_true", help="在标准错误输出各阶段耗时")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        print("\n".join(list_skills()))
+        return 0
+    if not args.skill:
+        parser.error("请指定 Skill")
+
+    load_env()
+    api_key = os.getenv("DEEPSEEK_API_KEY")
+    if not api_key:
+        print("❌ 请配置 DEEPSEEK_API_KEY", file=sys.stderr)
+        return 1
+    try:
+        skill = load_skill(args.skill)
+    except (OSError, ValueError) as e:
+        print(f"❌ 加载失败：{e}", file=sys.stderr)
+        return 1
+    user_input = " ".join(args.input) if args.input else sys.stdin.read()
+    if not user_input.strip():
+        print("❌ 请输入内容", file=sys.stderr)
+        return 1
+
+    client = make_client(api_key, os.getenv("DEEPSEEK_BASE_URL", "https://api.deepseek.com"))
+    t_ready = time.perf_counter()
+    try:
+        reply = run_skill(client, skill, user_input, steps=args.steps)
+    except Exception as e:
+        print(f"❌ 执行失败：{e}", file=sys.stderr)
+        return 1
+    t_done = time.perf_counter()
+    print(reply)
+
+    if args.format:
+        from file_writer import auto_generate_file
+        data, filename, _ = auto_generate_file(reply, args.format, skill["skill_name"])
+        os.makedirs(args.out, exist_ok=True)
+        path = os.path.join(args.out, filename)
+        with open(path, "wb") as f:
+            f.write(data)
+        print(f"✅ 已生成文件：{path}", file=sys.stderr)
+
+    if args.timing:
+        print(f"启动 {(t_ready - _t0) * 1000:.0f}ms，执行 {(t_done - t_ready) * 1000:.0f}ms，"
+              f"合计 {(time.perf_counter() - _t0) * 1000:.0f}ms", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,171 @@
+"""
+skill-forge/sop_engine.py
+按步骤执行 SOP：把 source_sop.steps 建成依赖图，每一步单独调用一次模型，
+互不依赖的步骤并发执行，步骤结果按输入哈希缓存，重新执行时从第一个变化的步骤开始
+"""
+
+import hashlib
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from llm_router import route_chat, stage_model
+
+MAX_WORKERS = 4
+
+# 这些说法表示依赖上一步的产出
+PREV_STEP_WORDS = ("上一步", "前一步", "上述", "前面", "上一阶段", "previous step")
+# 「步骤3」「步骤3-5」「步骤3、4、5」「第3~5步」「step 3-5」
+_NUMS = r"(\d+(?:\s*(?:[-~～—–至到、,，和及与]|and)\s*\d+)*)"
+STEP_REF = re.compile(rf"(?:步骤|step)\s*{_NUMS}|第\s*{_NUMS}\s*步", re.IGNORECASE)
+RANGE_SEPS = "-~～—–至到"
+ITEM_SEP = re.compile(r"[、，,；;。：:（）()\s]+|和|及|与|或")
+
+
+def _bigrams(text):
+    text = re.sub(r"\s+", "", text or "")
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+def parse_step_refs(text):
+    """返回文本中引用的全部步骤编号，区间按范围展开"""
+    refs = set()
+    for m in STEP_REF.finditer(text or ""):
+        nums = re.findall(r"\d+|[" + RANGE_SEPS + "]", m.group(1) or m.group(2))
+        prev, in_range = None, False
+        for tok in nums:
+            if tok in RANGE_SEPS:
+                in_range = prev is not None
+                continue
+            n = int(tok)
+            refs.update(range(prev + 1, n + 1) if in_range and n > prev else [n])
+            prev, in_range = n, False
+    return refs
+
+
+def _match_outputs(text, earlier_steps):
+    """把 input 拆成若干项，每项找产出中包含它（或字面大部分重合）的最近一步"""
+    deps = set()
+    for item in ITEM_SEP.split(text or ""):
+        if len(item) < 2:
+            continue
+        grams = _bigrams(item)
+        for prev in reversed(earlier_steps):
+            out = prev.get("output", "")
+            if item in out or (grams and len(grams & _bigrams(out)) / len(grams) >= 0.6):
+                deps.add(prev["step_number"])
+                break
+    return deps
+
+
+def build_step_graph(steps):
+    """
+    返回 {step_number: [依赖的 step_number, ...]}，依赖只会指向更早的步骤。
+    合并步骤里的 depends_on 与 input 中「步骤N」「步骤3-5」「上一步」等引用（模型常照抄模板里的空列表）；
+    都没有时按 input 中的各项匹配前面步骤的 output。仍找不到依赖、且步骤没有 depends_on 字段
+    （加入依赖字段之前保存的 Skill）时，默认依赖上一步，按顺序执行。
+    """
+    numbers = [s["step_number"] for s in steps]
+    graph = {}
+    for idx, step in enumerate(steps):
+        n = step["step_number"]
+        earlier = numbers[:idx]
+        explicit = step.get("depends_on")
+        deps = {int(d) for d in (explicit if isinstance(explicit, list) else [])
+                if str(d).strip().isdigit()}
+        text = step.get("input", "")
+        refs = parse_step_refs(text)
+        deps |= refs
+        if any(w in text for w in PREV_STEP_WORDS) and earlier:
+            deps.add(earlier[-1])
+            refs.add(earlier[-1])
+        if not refs:
+            deps |= _match_outputs(text, steps[:idx])
+        deps &= set(earlier)
+        if not deps and "depends_on" not in step and earlier:
+            deps.add(earlier[-1])
+        graph[n] = sorted(deps)
+    return graph
+
+
+def step_cache_key(model, sop_title, step, user_input, dep_results):
+    payload = json.dumps([model, sop_title, step, user_input, dep_results], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _step_prompt(sop, step, user_input, dep_results):
+    text = f"""你正在按 SOP《{sop['title']}》执行任务，现在只需完成其中一步。
+
+## 总目标
+{sop.get('objective', '')}
+
+## 用户输入
+{user_input}
+
+## 当前步骤：步骤 {step['step_number']}：{step['title']}
+- 描述：{step.get('description', '')}
+- 输入：{step.get('input', '')}
+- 需要产出：{step.get('output', '')}
+- 完成标准：{step.get('acceptance_criteria', '')}
+"""
+    for n, result in dep_results:
+        text += f"\n## 步骤 {n} 的产出\n{result}\n"
+    text += "\n直接输出这一步的产出，满足完成标准，不要重复其他步骤的内容。"
+    return text
+
+
+def run_sop_steps(client, sop, user_input, cache=None, max_workers=MAX_WORKERS, on_step=None):
+    """
+    执行 SOP 的全部步骤，返回 [(step, 结果文本, 是否命中缓存), ...]（按步骤顺序）。
+    cache 为任意 dict，键是步骤输入的哈希；on_step(step, 结果, 是否命中缓存) 在每步完成时调用。
+    """
+    steps = sop["steps"]
+    by_number = {s["step_number"]: s for s in steps}
+    if len(by_number) != len(steps):
+        raise ValueError("SOP 步骤编号重复")
+    graph = build_step_graph(steps)
+    model = stage_model("step")
+    cache = {} if cache is None else cache
+    results = {}
+    hits = {}
+
+    def run_step(step, key, dep_results):
+        response = route_chat(
+            client, "step",
+            messages=[{"role": "user", "content": _step_prompt(sop, step, user_input, dep_results)}],
+            temperature=0.3
+        )
+        return key, response.choices[0].message.content
+
+    def finish(n, result, hit):
+        results[n] = result
+        hits[n] = hit
+        if on_step:
+            on_step(by_number[n], result, hit)
+
+    remaining = dict(graph)
+    running = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while remaining or running:
+            ready = [n for n, deps in remaining.items() if all(d in results for d in deps)]
+            for n in ready:
+                del remaining[n]
+                step = by_number[n]
+                dep_results = [(d, results[d]) for d in graph[n]]
+                key = step_cache_key(model, sop["title"], step, user_input, dep_results)
+                if key in cache:
+                    finish(n, cache[key], True)
+                else:
+                    running[pool.submit(run_step, step, key, dep_results)] = n
+            if not running:
+                if not ready:
+                    raise ValueError("SOP 步骤依赖无法满足")
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                n = running.pop(fut)
+                key, result = fut.result()
+                cache[key] = result
+                finish(n, result, False)
+
+    return [(s, results[s["step_number"]], hits[s["step_number"]]) for s in steps]
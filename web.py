@@ -1,11 +1,17 @@
 """
 skill-forge/web.py
 """
-import os, io, json, base64, re
+import os, json, hashlib
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from dotenv import load_dotenv
 from openai import OpenAI
 import streamlit as st
+from file_parser import parse_files
+from file_writer import auto_generate_file
+from sop_engine import run_sop_steps
+from llm_router import route_chat, format_latency
+from llm_json import load_llm_json, validate_sop, validate_skill_schema, format_stats, iter_stream_partials
 
 load_dotenv()
 api_key = os.getenv("DEEPSEEK_API_KEY")
@@ -16,149 +22,58 @@ if not api_key:
         st.error("请配置 DEEPSEEK_API_KEY")
         st.stop()
 
-client = OpenAI(api_key=api_key, base_url="https://api.deepseek.com")
+client = OpenAI(api_key=api_key, base_url=os.getenv("DEEPSEEK_BASE_URL", "https://api.deepseek.com"))
 SKILLS_DIR = "skills"
 OUTPUT_DIR = "outputs"
 os.makedirs(SKILLS_DIR, exist_ok=True)
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
-for key, val in [("sop", None), ("sop_history", []), ("skill", None), ("chat_history", []), ("uploaded_text", "")]:
+for key, val in [("sop", None), ("sop_history", []), ("skill", None), ("chat_history", []), ("uploaded_text", ""), ("skill_spec", None), ("step_cache", {})]:
     if key not in st.session_state:
         st.session_state[key] = val
 
 UPLOAD_TYPES = ["txt","pdf","docx","xlsx","csv","json","md","pptx","xls","png","jpg","jpeg","gif","bmp","webp"]
 OUTPUT_OPTIONS = ["纯文字（不生成文件）","Word (.docx)","Excel (.xlsx)","PPT (.pptx)","TXT (.txt)","Markdown (.md)","JSON (.json)","PNG (.png)","JPG (.jpg)"]
+TABLE_MODE_MAP = {"自动（大表格发送统计概要）":"auto","统计概要 + 抽样":"profile","原文":"raw"}
 FMT_MAP = {"Word (.docx)":"docx","Excel (.xlsx)":"xlsx","PPT (.pptx)":"pptx","TXT (.txt)":"txt","Markdown (.md)":"md","JSON (.json)":"json","PNG (.png)":"png","JPG (.jpg)":"jpg"}
 
-def read_uploaded_file(uploaded_file):
-    name = uploaded_file.name.lower()
-    try:
-        if name.endswith((".png",".jpg",".jpeg",".gif",".bmp",".webp")):
-            img_bytes = uploaded_file.read()
-            return f"[图片文件: {uploaded_file.name}, 大小: {len(img_bytes)/1024:.1f}KB]"
-        elif name.endswith((".txt",".md")):
-            return uploaded_file.read().decode("utf-8")
-        elif name.endswith(".json"):
-            return json.dumps(json.loads(uploaded_file.read().decode("utf-8")), ensure_ascii=False, indent=2)
-        elif name.endswith(".csv"):
-            return uploaded_file.read().decode("utf-8")
-        elif name.endswith(".docx"):
-            from docx import Document
-            return "\n".join([p.text for p in Document(uploaded_file).paragraphs if p.text.strip()])
-        elif name.endswith((".xlsx",".xls")):
-            import openpyxl
-            wb = openpyxl.load_workbook(uploaded_file)
-            text = ""
-            for s in wb.sheetnames:
-                ws = wb[s]
-                text += f"\n--- {s} ---\n"
-                for row in ws.iter_rows(values_only=True):
-                    text += " | ".join([str(c) if c else "" for c in row]) + "\n"
-            return text
-        elif name.endswith(".pptx"):
-            from pptx import Presentation
-            prs = Presentation(uploaded_file)
-            text = ""
-            for i, slide in enumerate(prs.slides):
-                text += f"\n--- 幻灯片 {i+1} ---\n"
-                for shape in slide.shapes:
-                    if hasattr(shape,"text") and shape.text.strip():
-                        text += shape.text + "\n"
-            return text
-        elif name.endswith(".pdf"):
-            import PyPDF2
-            reader = PyPDF2.PdfReader(uploaded_file)
-            return "\n".join([p.extract_text() for p in reader.pages])
-        else:
-            return uploaded_file.read().decode("utf-8")
-    except Exception as e:
-        return f"[读取失败: {e}]"
-
-def generate_txt(content, fn):
-    return content.encode("utf-8"), f"{fn}.txt", "text/plain"
+class UploadParseError(Exception):
+    def __init__(self, texts):
+        super().__init__("部分文件解析失败")
+        self.texts = texts
 
-def generate_word(content, fn):
-    from docx import Document
-    doc = Document()
-    for line in content.split("\n"):
-        line = line.strip()
-        if not line: continue
-        if line.startswith("# "): doc.add_heading(line[2:], level=1)
-        elif line.startswith("## "): doc.add_heading(line[3:], level=2)
-        elif line.startswith("### "): doc.add_heading(line[4:], level=3)
-        else: doc.add_paragraph(line)
-    buf = io.BytesIO()
-    doc.save(buf)
-    buf.seek(0)
-    return buf.getvalue(), f"{fn}.docx", "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+@st.cache_data(show_spinner=False, max_entries=64)
+def parse_uploads(keys, table_mode, _files):
+    # 以 (文件名, 内容哈希) 和表格处理方式为键缓存解析结果，重新运行页面时不再重复解析
+    bar = st.progress(0.0, text="正在解析文件...")
+    def on_progress(done, total, name):
+        bar.progress(done / total, text=f"已解析 {done}/{total}：{name}")
+    texts = parse_files(_files, on_progress=on_progress, table_mode=table_mode)
+    bar.empty()
+    # 抛出异常的调用不会被缓存：有文件解析失败或超时时下次重新解析
+    if any(t.startswith("[读取失败") for t in texts):
+        raise UploadParseError(texts)
+    return texts
 
-def generate_excel(content, fn):
-    import openpyxl
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    for ri, line in enumerate(content.strip().split("\n"), 1):
-        line = line.strip().strip("|")
-        if not line: continue
-        for ci, cell in enumerate([c.strip() for c in line.split("|")], 1):
-            if cell.replace("-","").strip(): ws.cell(row=ri, column=ci, value=cell)
-    buf = io.BytesIO()
-    wb.save(buf)
-    buf.seek(0)
-    return buf.getvalue(), f"{fn}.xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-
-def generate_ppt(content, fn):
-    from pptx import Presentation
-    prs = Presentation()
-    parts = content.split("---")
-    if len(parts) == 1: parts = content.split("\n\n")
-    for part in parts:
-        part = part.strip()
-        if not part: continue
-        slide = prs.slides.add_slide(prs.slide_layouts[1])
-        lines = part.split("\n")
-        slide.shapes.title.text = lines[0].lstrip("#").strip() if lines else "幻灯片"
-        if len(lines) > 1 and slide.placeholders[1]:
-            slide.placeholders[1].text = "\n".join(lines[1:]).strip()
-    buf = io.BytesIO()
-    prs.save(buf)
-    buf.seek(0)
-    return buf.getvalue(), f"{fn}.pptx", "application/vnd.openxmlformats-officedocument.presentationml.presentation"
-
-def generate_image(content, fn, fmt="png"):
-    from PIL import Image, ImageDraw
-    lines = content.split("\n")
-    wrapped = []
-    for l in lines:
-        while len(l) > 70:
-            wrapped.append(l[:70])
-            l = l[70:]
-        wrapped.append(l)
-    h = max(600, len(wrapped)*28+80)
-    img = Image.new("RGB", (900, h), "white")
-    draw = ImageDraw.Draw(img)
-    y = 30
-    for l in wrapped:
-        draw.text((30, y), l, fill="black")
-        y += 28
-    buf = io.BytesIO()
-    img.save(buf, format="PNG" if fmt=="png" else "JPEG")
-    buf.seek(0)
-    return buf.getvalue(), f"{fn}.{fmt}", f"image/{fmt}" if fmt=="png" else "image/jpeg"
+def read_uploaded_files(uploaded_files):
+    files = [(uf.name, uf.getvalue()) for uf in uploaded_files]
+    keys = tuple((name, hashlib.sha256(data).hexdigest()) for name, data in files)
+    try:
+        return parse_uploads(keys, TABLE_MODE_MAP[st.session_state.get("table_mode", "自动（大表格发送统计概要）")], files)
+    except UploadParseError as e:
+        return e.texts
 
-def auto_generate_file(content, output_format, skill_name):
-    fn = skill_name.replace(" ","_").replace("/","_") + "_" + datetime.now().strftime("%Y%m%d_%H%M%S")
-    fmt = output_format.lower().strip()
-    if fmt in ["word","docx"]: return generate_word(content, fn)
-    elif fmt in ["excel","xlsx"]: return generate_excel(content, fn)
-    elif fmt in ["ppt","pptx"]: return generate_ppt(content, fn)
-    elif fmt in ["txt","text"]: return generate_txt(content, fn)
-    elif fmt == "json": return content.encode("utf-8"), f"{fn}.json", "application/json"
-    elif fmt in ["md","markdown"]: return content.encode("utf-8"), f"{fn}.md", "text/markdown"
-    elif fmt == "png": return generate_image(content, fn, "png")
-    elif fmt in ["jpg","jpeg"]: return generate_image(content, fn, "jpg")
-    else: return generate_txt(content, fn)
+def request_sop(prompt, on_partial=None):
+    if on_partial is None:
+        response = route_chat(client, "sop", messages=[{"role":"user","content":prompt}], temperature=0.3, response_format={"type":"json_object"})
+        return load_llm_json(response.choices[0].message.content, validate_sop, client)
+    stream = route_chat(client, "sop", messages=[{"role":"user","content":prompt}], temperature=0.3, response_format={"type":"json_object"}, stream=True)
+    parts = []
+    for partial in iter_stream_partials(stream, parts):
+        on_partial(partial)
+    return load_llm_json("".join(parts), validate_sop, client)
 
-def call_generate_sop(task_description, deliverable):
+def call_generate_sop(task_description, deliverable, on_partial=None):
     prompt = f"""你是一个专业的流程设计专家。请根据以下信息，生成一份详细的标准操作流程(SOP)。
 
 ## 任务描述
@@ -168,54 +83,111 @@ def call_generate_sop(task_description, deliverable):
 {deliverable}
 
 请以 JSON 格式输出：
-{{"title":"SOP标题","objective":"目标概述","steps":[{{"step_number":1,"title":"步骤标题","description":"具体做什么","input":"需要什么","output":"产出什么","acceptance_criteria":"完成标准"}}],"quality_checklist":["检查项1"],"final_deliverable":"最终交付物"}}
+{{"title":"SOP标题","objective":"目标概述","steps":[{{"step_number":1,"title":"步骤标题","description":"具体做什么","input":"需要什么","output":"产出什么","acceptance_criteria":"完成标准","depends_on":[]}}],"quality_checklist":["检查项1"],"final_deliverable":"最终交付物"}}
 
-只输出JSON。"""
-    response = client.chat.completions.create(model="deepseek-chat", messages=[{"role":"user","content":prompt}], temperature=0.3, response_format={"type":"json_object"})
-    return json.loads(response.choices[0].message.content)
+depends_on 填写该步 input 用到的前面步骤的 step_number，不依赖则为空列表。只输出JSON。"""
+    return request_sop(prompt, on_partial)
 
-def call_refine_sop(current_sop, feedback):
+def call_refine_sop(current_sop, feedback, on_partial=None):
     prompt = f"""你之前生成了以下 SOP：
 {json.dumps(current_sop, ensure_ascii=False, indent=2)}
 用户反馈：{feedback}
 请修改 SOP，输出完整 JSON（格式不变）。只输出 JSON。"""
-    response = client.chat.completions.create(model="deepseek-chat", messages=[{"role":"user","content":prompt}], temperature=0.3, response_format={"type":"json_object"})
-    return json.loads(response.choices[0].message.content)
+    return request_sop(prompt, on_partial)
 
 def call_generate_skill(sop):
     p1 = f"""请根据以下 SOP 为 AI 助手编写 system prompt。
 SOP：{json.dumps(sop, ensure_ascii=False, indent=2)}
 要求：包含完整执行流程、操作指引、质量检查、输出格式。直接输出 system prompt。"""
-    r1 = client.chat.completions.create(model="deepseek-chat", messages=[{"role":"user","content":p1}], temperature=0.2)
+    r1 = route_chat(client, "system_prompt", messages=[{"role":"user","content":p1}], temperature=0.2)
     system_prompt = r1.choices[0].message.content
     p2 = f"""根据以下 SOP 定义输入参数和输出格式。
 SOP：{json.dumps(sop, ensure_ascii=False, indent=2)}
 以 JSON 输出：{{"input_params":[{{"name":"参数名","description":"描述","type":"string","required":true,"example":"示例"}}],"output_format":{{"description":"输出描述","fields":[{{"name":"字段名","description":"描述"}}]}}}}
 只输出 JSON。"""
-    r2 = client.chat.completions.create(model="deepseek-chat", messages=[{"role":"user","content":p2}], temperature=0.2, response_format={"type":"json_object"})
-    schema = json.loads(r2.choices[0].message.content)
+    r2 = route_chat(client, "schema", messages=[{"role":"user","content":p2}], temperature=0.2, response_format={"type":"json_object"})
+    schema = load_llm_json(r2.choices[0].message.content, validate_skill_schema, client)
     return {"skill_name":sop["title"],"description":sop["objective"],"version":"1.0","created_at":datetime.now().strftime("%Y-%m-%d %H:%M:%S"),"system_prompt":system_prompt,"input_params":schema.get("input_params",[]),"output_format":schema.get("output_format",{}),"source_sop":sop}
 
+@st.cache_resource
+def get_spec_executor():
+    return ThreadPoolExecutor(max_workers=4)
+
+def sop_hash(sop):
+    return hashlib.sha256(json.dumps(sop, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+def speculate_skill(sop):
+    h = sop_hash(sop)
+    spec = st.session_state.skill_spec
+    if spec is not None and spec["hash"] == h: return
+    discard_speculation()
+    st.session_state.skill_spec = {"hash":h,"future":get_spec_executor().submit(call_generate_skill, sop)}
+
+def discard_speculation():
+    # 已经开始的请求无法中断，只能丢弃结果
+    spec = st.session_state.skill_spec
+    if spec is not None and spec["future"] is not None:
+        spec["future"].cancel()
+    st.session_state.skill_spec = None
+
+def take_speculative_skill(sop):
+    h = sop_hash(sop)
+    spec = st.session_state.skill_spec
+    future = spec["future"] if spec is not None else None
+    # 保留已确认 SOP 的哈希，确认后重新运行页面时不会为同一份 SOP 再预生成一次
+    st.session_state.skill_spec = {"hash":h,"future":None}
+    # 预生成还在共享线程池里排队（cancel 成功）时直接生成，不排在其他会话的任务后面
+    if future is not None and not future.cancel() and spec["hash"] == h:
+        try:
+            skill = future.result()
+            skill["created_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            return skill
+        except Exception:
+            pass
+    return call_generate_skill(sop)
+
+def run_skill_steps(user_input):
+    status = st.empty()
+    def on_step(step, result, hit):
+        status.markdown(f"{'♻️ 复用' if hit else '✅ 完成'} 步骤 {step['step_number']}：{step['title']}")
+    done = run_sop_steps(client, st.session_state.skill["source_sop"], user_input, cache=st.session_state.step_cache, on_step=on_step)
+    status.empty()
+    return "\n\n".join(f"### 步骤 {s['step_number']}：{s['title']}\n{r}" for s, r, _ in done)
+
 def display_sop(sop):
-    st.markdown(f"## 📋 {sop['title']}")
-    st.markdown(f"**🎯 目标：** {sop['objective']}")
-    st.markdown("---")
-    for step in sop["steps"]:
-        st.markdown(f"### 步骤 {step['step_number']}：{step['title']}")
-        st.markdown(f"- 📖 **描述：** {step['description']}")
-        st.markdown(f"- 📥 **输入：** {step['input']}")
-        st.markdown(f"- 📤 **输出：** {step['output']}")
-        st.markdown(f"- ✅ **完成标准：** {step['acceptance_criteria']}")
+    # 流式生成时 sop 可能只有部分字段，已到达的部分先展示
+    st.markdown(f"## 📋 {sop.get('title', '...')}")
+    if "objective" in sop:
+        st.markdown(f"**🎯 目标：** {sop['objective']}")
     st.markdown("---")
-    st.markdown("### 🔍 质量检查清单")
-    for item in sop["quality_checklist"]:
-        st.markdown(f"- {item}")
-    st.markdown(f"**📦 最终交付物：** {sop['final_deliverable']}")
+    for step in sop.get("steps", []):
+        st.markdown(f"### 步骤 {step.get('step_number', '')}：{step.get('title', '')}")
+        st.markdown(f"- 📖 **描述：** {step.get('description', '')}")
+        st.markdown(f"- 📥 **输入：** {step.get('input', '')}")
+        st.markdown(f"- 📤 **输出：** {step.get('output', '')}")
+        st.markdown(f"- ✅ **完成标准：** {step.get('acceptance_criteria', '')}")
+    if "quality_checklist" in sop:
+        st.markdown("---")
+        st.markdown("### 🔍 质量检查清单")
+        for item in sop["quality_checklist"]:
+            st.markdown(f"- {item}")
+    if "final_deliverable" in sop:
+        st.markdown(f"**📦 最终交付物：** {sop['final_deliverable']}")
+
+def live_sop_view():
+    live = st.empty()
+    def show(partial):
+        with live.container():
+            display_sop(partial)
+    return show
 
 st.set_page_config(page_title="Skill Forge", page_icon="🔧", layout="wide")
 st.title("🔧 Skill Forge")
 st.markdown("*输入任务描述 → AI 生成 SOP → 你确认修改 → 固化为可复用的 Skill*")
 st.markdown("---")
+st.sidebar.radio("📊 表格文件（CSV / Excel）", list(TABLE_MODE_MAP), key="table_mode")
+st.sidebar.caption(format_stats())
+st.sidebar.caption(format_latency())
 tab1, tab2 = st.tabs(["🆕 创建新 Skill", "📂 使用已有 Skill"])
 
 with tab1:
@@ -229,9 +201,9 @@ with tab1:
     uploaded_files = st.file_uploader("支持多种格式", accept_multiple_files=True, type=UPLOAD_TYPES)
     if uploaded_files:
         all_text = ""
-        for uf in uploaded_files:
+        for uf, text in zip(uploaded_files, read_uploaded_files(uploaded_files)):
             st.markdown(f"✅ 已上传：**{uf.name}**")
-            all_text += f"\n\n=== {uf.name} ===\n{read_uploaded_file(uf)}"
+            all_text += f"\n\n=== {uf.name} ===\n{text}"
         st.session_state.uploaded_text = all_text
         with st.expander("📄 查看文件内容"):
             st.text(all_text[:3000] + ("..." if len(all_text) > 3000 else ""))
@@ -244,7 +216,8 @@ with tab1:
                 full_task += f"\n\n## 参考资料\n{st.session_state.uploaded_text}"
             with st.spinner("正在生成 SOP..."):
                 try:
-                    sop = call_generate_sop(full_task, deliverable)
+                    discard_speculation()
+                    sop = call_generate_sop(full_task, deliverable, on_partial=live_sop_view())
                     st.session_state.sop = sop
                     st.session_state.sop_history = []
                     st.success("SOP 生成成功！")
@@ -255,6 +228,7 @@ with tab1:
         st.markdown("---")
         st.markdown("### 第二步：审核和修改 SOP")
         display_sop(st.session_state.sop)
+        speculate_skill(st.session_state.sop)
         st.markdown("---")
         feedback = st.text_input("修改意见", placeholder="例如：第三步太笼统了，请拆成更细的步骤")
         ca, cb = st.columns(2)
@@ -265,8 +239,9 @@ with tab1:
                 else:
                     with st.spinner("正在修改 SOP..."):
                         try:
+                            discard_speculation()
                             st.session_state.sop_history.append(st.session_state.sop)
-                            st.session_state.sop = call_refine_sop(st.session_state.sop, feedback)
+                            st.session_state.sop = call_refine_sop(st.session_state.sop, feedback, on_partial=live_sop_view())
                             st.success("修改成功！")
                             st.rerun()
                         except Exception as e:
@@ -277,6 +252,7 @@ with tab1:
                 if not st.session_state.sop_history:
                     st.warning("已经是最初版本")
                 else:
+                    discard_speculation()
                     st.session_state.sop = st.session_state.sop_history.pop()
                     st.success("已撤销！")
                     st.rerun()
@@ -285,7 +261,7 @@ with tab1:
         if st.button("✅ 确认 SOP，生成 Skill", type="primary", use_container_width=True):
             with st.spinner("正在生成 Skill（约需30秒）..."):
                 try:
-                    skill = call_generate_skill(st.session_state.sop)
+                    skill = take_speculative_skill(st.session_state.sop)
                     fn = skill["skill_name"].replace(" ","_").replace("/","_")
                     fp = os.path.join(SKILLS_DIR, f"{fn}.json")
                     with open(fp, "w", encoding="utf-8") as f:
@@ -305,10 +281,11 @@ with tab1:
         chat_files = st.file_uploader("📎 上传文件（可选）", accept_multiple_files=True, type=UPLOAD_TYPES, key="cf1")
         cft = ""
         if chat_files:
-            for cf in chat_files:
+            for cf, text in zip(chat_files, read_uploaded_files(chat_files)):
                 st.markdown(f"✅ {cf.name}")
-                cft += f"\n\n=== {cf.name} ===\n{read_uploaded_file(cf)}"
+                cft += f"\n\n=== {cf.name} ===\n{text}"
         ofmt = st.selectbox("📤 输出格式", OUTPUT_OPTIONS, key="of1")
+        step_mode = st.checkbox("🧩 按 SOP 步骤执行（无依赖的步骤并行，未变化的步骤直接复用）", key="sm1")
         for msg in st.session_state.chat_history:
             st.chat_message(msg["role"]).markdown(msg["content"])
         user_msg = st.chat_input("输入你的内容")
@@ -321,10 +298,13 @@ with tab1:
             with st.chat_message("assistant"):
                 with st.spinner("思考中..."):
                     try:
-                        msgs = [{"role":"system","content":st.session_state.skill["system_prompt"]}]
-                        msgs.extend(st.session_state.chat_history)
-                        response = client.chat.completions.create(model="deepseek-chat", messages=msgs, temperature=0.3)
-                        reply = response.choices[0].message.content
+                        if step_mode and st.session_state.skill.get("source_sop", {}).get("steps"):
+                            reply = run_skill_steps(full_msg)
+                        else:
+                            msgs = [{"role":"system","content":st.session_state.skill["system_prompt"]}]
+                            msgs.extend(st.session_state.chat_history)
+                            response = route_chat(client, "chat", messages=msgs, temperature=0.3)
+                            reply = response.choices[0].message.content
                         st.markdown(reply)
                         st.session_state.chat_history.append({"role":"assistant","content":reply})
                         if ofmt != "纯文字（不生成文件）":
@@ -367,10 +347,11 @@ with tab2:
             chat_files2 = st.file_uploader("📎 上传文件（可选）", accept_multiple_files=True, type=UPLOAD_TYPES, key="cf2")
             cft2 = ""
             if chat_files2:
-                for cf in chat_files2:
+                for cf, text in zip(chat_files2, read_uploaded_files(chat_files2)):
                     st.markdown(f"✅ {cf.name}")
-                    cft2 += f"\n\n=== {cf.name} ===\n{read_uploaded_file(cf)}"
+                    cft2 += f"\n\n=== {cf.name} ===\n{text}"
             ofmt2 = st.selectbox("📤 输出格式", OUTPUT_OPTIONS, key="of2")
+            step_mode2 = st.checkbox("🧩 按 SOP 步骤执行（无依赖的步骤并行，未变化的步骤直接复用）", key="sm2")
             for msg in st.session_state.chat_history:
                 st.chat_message(msg["role"]).markdown(msg["content"])
             user_msg2 = st.chat_input("输入你的需求...", key="ci2")
@@ -383,10 +364,13 @@ with tab2:
                 with st.chat_message("assistant"):
                     with st.spinner("思考中..."):
                         try:
-                            msgs = [{"role":"system","content":st.session_state.skill["system_prompt"]}]
-                            msgs.extend(st.session_state.chat_history)
-                            response = client.chat.completions.create(model="deepseek-chat", messages=msgs, temperature=0.3)
-                            reply = response.choices[0].message.content
+                            if step_mode2 and st.session_state.skill.get("source_sop", {}).get("steps"):
+                                reply = run_skill_steps(full_msg2)
+                            else:
+                                msgs = [{"role":"system","content":st.session_state.skill["system_prompt"]}]
+                                msgs.extend(st.session_state.chat_history)
+                                response = route_chat(client, "chat", messages=msgs, temperature=0.3)
+                                reply = response.choices[0].message.content
                             st.markdown(reply)
                             st.session_state.chat_history.append({"role":"assistant","content":reply})
                             if ofmt2 != "纯文字（不生成文件）":